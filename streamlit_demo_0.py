@@ -1,37 +1,85 @@
 import os
 import streamlit as st
 from google import genai
-from google.genai.types import Part, Tool, GenerateContentConfig, GoogleSearch
-import concurrent.futures
+from google.genai import errors
+from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
+import asyncio
+import hashlib
+import io
 import time
+import diskcache
+import numpy as np
+from aiolimiter import AsyncLimiter
+from PIL import Image, ImageOps
 import nest_asyncio
 import re
-import difflib
-from collections import defaultdict
+import string
+from collections import Counter, defaultdict
+import orjson
 from dotenv import load_dotenv
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 
-# Load environment variables
-load_dotenv()
-
 # Apply nest_asyncio to allow nested event loops (needed for Streamlit)
 nest_asyncio.apply()
 
 # Streamlit page configuration
 st.set_page_config(page_title="Prescription Reader", page_icon="💊", layout="wide")
 
-# Initialize the client with API key from Streamlit secrets
-try:
-    API_KEY = os.getenv("GOOGLE_API_KEY")
-except KeyError:
-    st.error("Please set the GOOGLE_API_KEY in .streamlit/secrets.toml")
-    st.stop()
 
-client = genai.Client(api_key=API_KEY)
+# Create the client once per session so reruns reuse its HTTP connection pool
+# instead of re-reading .env and negotiating new TLS connections. Its async
+# connections belong to the session's event loop, so it isn't shared.
+def get_client():
+    if "client" not in st.session_state:
+        load_dotenv()
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            st.error("Please set GOOGLE_API_KEY in the environment or a .env file")
+            st.stop()
+        st.session_state.client = genai.Client(api_key=api_key)
+    return st.session_state.client
+
+
+# Configure the Google Search tool once as well
+@st.cache_resource
+def get_search_tool():
+    return Tool(google_search=GoogleSearch())
+
+
 model_id = "gemini-2.0-flash"
+embedding_model_id = "gemini-embedding-001"
+
+# Persistent response cache shared across reruns and app restarts
+gemini_cache = diskcache.Cache("./.gemini_cache")
+CACHE_TTL = 24 * 60 * 60  # expire after a day so pharma data stays fresh
+SIMILARITY_THRESHOLD = 0.95
+
+# Verify all medicine groups in one Gemini call; groups missing from the
+# batched answer fall back to one call per group
+BATCH_VERIFICATION = True
+
+# Stop outstanding interpretation passes once this many have finished and
+# agree on every medicine at high confidence
+CONSENSUS_MIN_PASSES = 3
+CONSENSUS_AGREEMENT = 0.9
+CONSENSUS_MIN_CONFIDENCE = 90
+
+# Matches interpretation lines like "1. Napa 500: 95%"
+_RE_MED = re.compile(r"^(\d+)\.\s+(.*?):\s*(\d+)%")
+# Punctuation and whitespace ignored when comparing candidate names
+_RE_NON_WORD = re.compile(r"\W+")
+
+
+# Key used to treat candidate names as the same medicine
+def normalize_medicine_name(name):
+    return _RE_NON_WORD.sub("", name.casefold())
 
-# Configure Google Search Tool
-google_search_tool = Tool(google_search=GoogleSearch())
 
 # Streamlit UI
 st.title("Prescription Reader")
@@ -45,9 +93,91 @@ uploaded_file = st.file_uploader(
 )
 
 
-# Function to make a single API call for interpretation
-def generate_interpretation(temperature, image):
-    initial_prompt = """
+# Keep one event loop per session across reruns so the session's client
+# connections stay usable. A loop shared between sessions would let one
+# session's script thread step another's coroutines, sending their st.*
+# output to the wrong page.
+def get_event_loop():
+    if "event_loop" not in st.session_state:
+        loop = asyncio.new_event_loop()
+        nest_asyncio.apply(loop)
+        st.session_state.event_loop = loop
+    return st.session_state.event_loop
+
+
+# Run a coroutine to completion on the session's event loop
+def run_async(coroutine):
+    return get_event_loop().run_until_complete(coroutine)
+
+
+# Gemini errors worth retrying: 429 RESOURCE_EXHAUSTED and 503 UNAVAILABLE
+def is_retryable_error(exception):
+    return isinstance(exception, errors.APIError) and exception.code in (429, 503)
+
+
+# Seconds to wait as requested by the server's RetryInfo detail, if any
+def server_retry_delay(exception):
+    details = getattr(exception, "details", None)
+    if not isinstance(details, dict):
+        return None
+    for detail in details.get("error", {}).get("details", []):
+        retry_delay = detail.get("retryDelay")
+        if retry_delay:
+            return float(retry_delay.rstrip("s"))
+    return None
+
+
+# Honor the server-provided delay, otherwise back off exponentially with jitter
+backoff_with_jitter = wait_random_exponential(min=1, max=60)
+
+
+def wait_for_retry(retry_state):
+    delay = server_retry_delay(retry_state.outcome.exception())
+    return delay if delay is not None else backoff_with_jitter(retry_state)
+
+
+gemini_retry = retry(
+    stop=stop_after_attempt(5),
+    wait=wait_for_retry,
+    retry=retry_if_exception(is_retryable_error),
+    reraise=True,
+)
+
+
+# Pace requests under the per-minute quota; kept per session, like the event
+# loop it waits on, so the window survives reruns
+def get_rate_limiter():
+    if "rate_limiter" not in st.session_state:
+        st.session_state.rate_limiter = AsyncLimiter(max_rate=15, time_period=60)
+    return st.session_state.rate_limiter
+
+
+GEMINI_SEMAPHORE = asyncio.Semaphore(6)
+
+
+# Single entry point for Gemini generation so every call shares the retry policy
+@gemini_retry
+async def generate_content_async(**kwargs):
+    async with get_rate_limiter():
+        async with GEMINI_SEMAPHORE:
+            return await get_client().aio.models.generate_content(**kwargs)
+
+
+# Streaming variant; retries and pacing apply to opening the stream
+@gemini_retry
+async def generate_content_stream_async(**kwargs):
+    async with get_rate_limiter():
+        async with GEMINI_SEMAPHORE:
+            return await get_client().aio.models.generate_content_stream(**kwargs)
+
+
+# Build a compact cache key from everything that determines a Gemini response
+def make_cache_key(kind, *parts):
+    digest = hashlib.sha256("\x00".join(map(str, parts)).encode()).hexdigest()
+    return f"{kind}:{digest}"
+
+
+initial_prompt = """
     This image contains a handwritten prescription. Please analyze it and provide:
     1. Your interpretation of each medicine name in the prescription
     2. For each medicine name, assign a confidence percentage (0-100%)
@@ -59,50 +189,123 @@ def generate_interpretation(temperature, image):
     1. --
     2. --
     """
-    response = client.models.generate_content(
+
+
+# Downscale and recompress the upload before it is sent to Gemini, which
+# resizes large images internally anyway; phone photos shrink ~10x
+@st.cache_data(show_spinner=False, ttl=3600)
+def prepare_image_bytes(raw_bytes, max_side=1568, quality=85):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(raw_bytes)))
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+# Cache key for one interpretation pass of a given image
+def interpretation_cache_key(image_digest, temperature):
+    return make_cache_key(
+        "interpretation", model_id, initial_prompt, image_digest, temperature
+    )
+
+
+# Async function to make a single API call for interpretation
+async def generate_interpretation_async(temperature, image_ref, image_digest):
+    cache_key = interpretation_cache_key(image_digest, temperature)
+    cached_text = gemini_cache.get(cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    response = await generate_content_async(
         model=model_id,
-        contents=[initial_prompt, image],
+        contents=[initial_prompt, image_ref],
         config=GenerateContentConfig(temperature=temperature),
     )
+    gemini_cache.set(cache_key, response.text, expire=CACHE_TTL)
     return response.text
 
 
-# Run all interpretations in parallel using ThreadPoolExecutor
-def run_parallel_interpretations(image, num_passes=5):
+# Run all interpretations concurrently on a single event loop. Not wrapped in
+# st.cache_data, which would replay a run with failed passes for an hour;
+# successful passes are already cached on disk individually.
+def run_parallel_interpretations(image_bytes, num_passes=5):
     temperatures = [0.7 + (i * 0.2) for i in range(num_passes)]
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_passes) as executor:
-        future_to_temp = {
-            executor.submit(generate_interpretation, temp, image): temp
-            for temp in temperatures
+    image_digest = hashlib.sha256(image_bytes).hexdigest()
+
+    # Start from the passes already cached on disk; a repeated prescription
+    # whose cached passes agree needs no upload and no API call at all
+    completed = {}
+    for temp in temperatures:
+        cached_text = gemini_cache.get(interpretation_cache_key(image_digest, temp))
+        if cached_text is not None:
+            completed[temp] = cached_text
+    uncached_temps = [temp for temp in temperatures if temp not in completed]
+    if completed:
+        st.write(f"Reusing {len(completed)} cached interpretation(s)")
+    if not uncached_temps or has_consensus(list(completed.values())):
+        return [completed[temp] for temp in sorted(completed)]
+
+    # Upload the image once and reference it from every uncached pass instead
+    # of sending the bytes with each request
+    async def collect_interpretations():
+        image_ref = await get_client().aio.files.upload(
+            file=io.BytesIO(image_bytes), config={"mime_type": "image/jpeg"}
+        )
+
+        task_to_temp = {
+            asyncio.ensure_future(
+                generate_interpretation_async(temp, image_ref, image_digest)
+            ): temp
+            for temp in uncached_temps
         }
-        results = []
-        for future in concurrent.futures.as_completed(future_to_temp):
-            temp = future_to_temp[future]
-            try:
-                result = future.result()
-                st.write(f"Completed interpretation with temperature {temp:.1f}")
-                results.append((temp, result))
-            except Exception as e:
-                st.error(f"Error processing temperature {temp}: {e}")
-
-    results.sort()
-    return [r[1] for r in results]
+        pending = set(task_to_temp)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    temp = task_to_temp[task]
+                    if task.exception() is not None:
+                        st.error(
+                            f"Error processing temperature {temp}: {task.exception()}"
+                        )
+                        continue
+                    st.write(f"Completed interpretation with temperature {temp:.1f}")
+                    completed[temp] = task.result()
+
+                if pending and has_consensus(list(completed.values())):
+                    st.write(
+                        f"Passes agree, skipping {len(pending)} remaining interpretation(s)"
+                    )
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await get_client().aio.files.delete(name=image_ref.name)
+
+        return [completed[temp] for temp in sorted(completed)]
+
+    results = run_async(collect_interpretations())
+    return results
 
 
 # Function to extract a list of possible medicine names from all interpretations
+@st.cache_data(show_spinner=False, ttl=3600)
 def extract_medicine_candidates(interpretations):
     medicine_candidates = []
 
     for interpretation in interpretations:
         lines = interpretation.strip().split("\n")
         for line in lines:
-            match = re.search(r"^\d+\.\s+(.*?):\s*(\d+)%", line)
+            # Strip indentation here rather than adding ^\s* to the pattern,
+            # which would lose the literal-prefix fast path
+            match = _RE_MED.match(line.lstrip())
             if match:
-                medicine_name = match.group(1).strip()
-                confidence = int(match.group(2))
-                position_match = re.search(r"^(\d+)\.", line)
-                position = int(position_match.group(1)) if position_match else 0
+                position = int(match.group(1))
+                medicine_name = match.group(2).strip()
+                confidence = int(match.group(3))
 
                 medicine_candidates.append(
                     {
@@ -115,25 +318,238 @@ def extract_medicine_candidates(interpretations):
     return medicine_candidates
 
 
+# Check whether finished passes agree on the top name at every position
+def has_consensus(interpretations):
+    if len(interpretations) < CONSENSUS_MIN_PASSES:
+        return False
+
+    # Only high-confidence readings count as votes for a name
+    name_counts = {}
+    for candidate in extract_medicine_candidates(interpretations):
+        counts = name_counts.setdefault(candidate["position"], Counter())
+        if candidate["confidence"] >= CONSENSUS_MIN_CONFIDENCE:
+            key = normalize_medicine_name(candidate["name"])
+            counts[key] += 1
+
+    return bool(name_counts) and all(
+        counts
+        and counts.most_common(1)[0][1] / len(interpretations) >= CONSENSUS_AGREEMENT
+        for counts in name_counts.values()
+    )
+
+
 # Function to group similar medicine name candidates
+@st.cache_data(show_spinner=False, ttl=3600)
 def group_similar_medicines(medicine_candidates):
-    medicine_candidates.sort(key=lambda x: x["position"])
-    position_groups = defaultdict(list)
+    candidates_by_position = defaultdict(list)
     for candidate in medicine_candidates:
-        position_groups[candidate["position"]].append(candidate)
+        candidates_by_position[candidate["position"]].append(candidate)
 
     formatted_groups = []
-    for position in sorted(position_groups.keys()):
-        group = position_groups[position]
-        group_text = f"Medicine {position}: ["
+    for position in sorted(candidates_by_position):
+        # Keep one candidate per normalized name, at its highest confidence
+        unique_candidates = {}
+        for candidate in candidates_by_position[position]:
+            key = normalize_medicine_name(candidate["name"])
+            best = unique_candidates.get(key)
+            if best is None or candidate["confidence"] > best["confidence"]:
+                unique_candidates[key] = candidate
+        group = list(unique_candidates.values())
+
         medicine_texts = [f"{med['name']}: {med['confidence']}%" for med in group]
-        group_text += ", ".join(medicine_texts) + "]"
+        group_text = f"Medicine {position}: [{', '.join(medicine_texts)}]"
         formatted_groups.append((position, group_text, group))
 
     return formatted_groups
 
 
-# Function to verify grouped medicines using Google Search
+# Normalized names of the candidates in a medicine group, matching how
+# group_similar_medicines dedupes them
+def normalized_group_names(group):
+    return sorted({normalize_medicine_name(med["name"]) for med in group})
+
+
+# Normalize a medicine group to the names that determine its verification
+def normalize_medicine_group(group):
+    return ", ".join(normalized_group_names(group))
+
+
+# Readable group text to embed; punctuation and spacing help the embedding
+def medicine_group_text(group):
+    return ", ".join(sorted({med["name"].strip() for med in group}))
+
+
+# Async function to embed text as a unit vector for similarity lookups.
+# Embeddings have their own quota, so they skip the generation rate limiter.
+@gemini_retry
+async def embed_text_async(text):
+    async with GEMINI_SEMAPHORE:
+        response = await get_client().aio.models.embed_content(
+            model=embedding_model_id, contents=text
+        )
+    embedding = np.asarray(response.embeddings[0].values, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+# Cache key listing the verifications whose groups include a normalized name
+def verification_name_index_key(name):
+    return make_cache_key("verification-name", model_id, name)
+
+
+# Find a cached verification whose medicine names are semantically close enough.
+# Only groups sharing at least one exact name are considered: similar strings
+# such as "napa 500" and "napa extra 500" are different drugs.
+def find_similar_verification(group, embedding):
+    candidate_keys = set()
+    for name in normalized_group_names(group):
+        candidate_keys.update(gemini_cache.get(verification_name_index_key(name), ()))
+
+    best_text, best_score = None, SIMILARITY_THRESHOLD
+    for key in candidate_keys:
+        entry = gemini_cache.get(key)
+        if entry is None or entry["embedding"] is None:
+            continue
+        score = float(np.dot(embedding, entry["embedding"]))
+        if score >= best_score:
+            best_text, best_score = entry["text"], score
+    return best_text
+
+
+# Cache key for the verification of a normalized medicine group
+def verification_cache_key(group):
+    return make_cache_key("verification", model_id, normalize_medicine_group(group))
+
+
+# Look up a cached verification by exact names, then by embedding similarity.
+# Returns the cached text (or None) and the embedding to store on a miss.
+async def lookup_verification_async(group):
+    entry = gemini_cache.get(verification_cache_key(group))
+    if entry is not None:
+        return entry["text"], None
+
+    try:
+        embedding = await embed_text_async(medicine_group_text(group))
+    except errors.APIError:
+        return None, None
+    return find_similar_verification(group, embedding), embedding
+
+
+# Store a fresh verification so repeat and similar groups can reuse it
+def store_verification(group, text, embedding):
+    cache_key = verification_cache_key(group)
+    gemini_cache.set(
+        cache_key, {"text": text, "embedding": embedding}, expire=CACHE_TTL
+    )
+
+    # Index it under each name so similarity lookups don't scan the whole cache
+    with gemini_cache.transact():
+        for name in normalized_group_names(group):
+            index_key = verification_name_index_key(name)
+            cache_keys = gemini_cache.get(index_key, set())
+            cache_keys.add(cache_key)
+            gemini_cache.set(index_key, cache_keys, expire=CACHE_TTL)
+
+
+# Async function to verify a single medicine group using Google Search
+async def verify_medicine_group_async(prompt, group):
+    cached_text, embedding = await lookup_verification_async(group)
+    if cached_text is not None:
+        return cached_text
+    return await generate_verification_async(prompt, group, embedding)
+
+
+# Async function to verify a medicine group that is known to be uncached
+async def generate_verification_async(prompt, group, embedding):
+    response = await generate_content_async(
+        model=model_id,
+        contents=prompt,
+        config=GenerateContentConfig(
+            tools=[get_search_tool()],
+            response_modalities=["TEXT"],
+            temperature=0.2,
+        ),
+    )
+    store_verification(group, response.text, embedding)
+    return response.text
+
+
+# Parse the batched verification JSON array into result text per position
+def parse_batched_verification(text):
+    text = text.strip().removeprefix("```json").removeprefix("```")
+    entries = orjson.loads(text.removesuffix("```"))
+    return {
+        int(entry["position"]): (
+            f"1. Medicine name: {entry.get('name', '')}\n"
+            f"2. Dosage: {entry.get('dosage', '')}\n"
+            f"3. Description: {entry.get('description', '')}"
+        )
+        for entry in entries
+    }
+
+
+# Async function to verify every uncached medicine group in a single call.
+# Returns results by position, leaving out positions it could not answer,
+# and the embeddings computed for the cache misses so fallbacks can reuse them.
+async def verify_medicine_groups_batched_async(medicine_groups):
+    lookups = await asyncio.gather(
+        *[lookup_verification_async(group) for _, _, group in medicine_groups]
+    )
+
+    results = {}
+    misses = []
+    for (position, group_text, group), (cached_text, embedding) in zip(
+        medicine_groups, lookups
+    ):
+        if cached_text is not None:
+            results[position] = cached_text
+        else:
+            misses.append((position, group_text, group, embedding))
+    embeddings = {position: embedding for position, _, _, embedding in misses}
+    if not misses:
+        return results, embeddings
+
+    group_lines = "\n".join(group_text for _, group_text, _, _ in misses)
+    prompt = f"""
+    I have multiple interpretations of several medicine names from a handwritten prescription, one line per position:
+
+    {group_lines}
+
+    For each position, determine the most likely correct medicine name.
+    Focus on medicines available in Bangladesh and check pharmaceutical websites like MedEx or Arogga or  Lazzpharma or MedEasy.
+
+    Respond only with a JSON array containing one object per position:
+    [{{"position": 1, "name": "...", "dosage": "...", "description": "..."}}]
+    - name: the correct medicine name (taken from Medex or Arogga or Lazzpharma or MedEasy)
+    - dosage: the dosage information if available, otherwise an empty string
+    - description: brief description of what this medicine is used for
+
+    Important: To get better search result carefully choose the medicine name from each group
+    """
+
+    try:
+        response = await generate_content_async(
+            model=model_id,
+            contents=prompt,
+            config=GenerateContentConfig(
+                tools=[get_search_tool()],
+                response_modalities=["TEXT"],
+                temperature=0.2,
+            ),
+        )
+        batched_results = parse_batched_verification(response.text)
+    except (errors.APIError, ValueError, KeyError, TypeError):
+        return results, embeddings
+
+    for position, _, group, embedding in misses:
+        if position in batched_results:
+            store_verification(group, batched_results[position], embedding)
+            results[position] = batched_results[position]
+    return results, embeddings
+
+
+# Function to verify grouped medicines using Google Search. Like the
+# interpretations, only successful verifications are cached (on disk), so
+# failed ones are retried on the next run.
 def verify_medicine_groups(medicine_groups):
     verification_prompts = []
 
@@ -153,49 +569,63 @@ def verify_medicine_groups(medicine_groups):
         
         Important: To get better search result carefully choose the medicine name from the group
         """
-        verification_prompts.append((position, prompt))
+        verification_prompts.append((position, prompt, group))
 
-    verification_results = []
+    async def gather_verifications():
+        results, embeddings = {}, {}
+        if BATCH_VERIFICATION:
+            results, embeddings = await verify_medicine_groups_batched_async(
+                medicine_groups
+            )
 
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=min(6, len(verification_prompts))
-    ) as executor:
-        future_to_position = {
-            executor.submit(
-                lambda p: (
-                    p[0],
-                    client.models.generate_content(
-                        model=model_id,
-                        contents=p[1],
-                        config=GenerateContentConfig(
-                            tools=[google_search_tool],
-                            response_modalities=["TEXT"],
-                            temperature=0.2,
-                        ),
-                    ).text,
-                ),
-                prompt,
-            ): prompt
-            for prompt in verification_prompts
+        # Groups the batched step already looked up skip a second cache lookup
+        # and embedding call
+        def verify_group(position, prompt, group):
+            if position in embeddings:
+                return generate_verification_async(prompt, group, embeddings[position])
+            return verify_medicine_group_async(prompt, group)
+
+        task_to_position = {
+            asyncio.ensure_future(verify_group(position, prompt, group)): position
+            for position, prompt, group in verification_prompts
+            if position not in results
         }
+        if task_to_position:
+            await asyncio.wait(task_to_position)
+        for task, position in task_to_position.items():
+            results[position] = task.exception() or task.result()
+        return results
 
-        for future in concurrent.futures.as_completed(future_to_position):
-            prompt = future_to_position[future]
-            try:
-                position, result = future.result()
-                verification_results.append((position, result))
-                st.write(f"Verified medicine at position {position}")
-            except Exception as e:
-                st.error(f"Error verifying medicine at position {prompt[0]}: {e}")
-                verification_results.append((prompt[0], f"Error: {str(e)}"))
+    results_by_position = run_async(gather_verifications())
+    verification_results = []
+    for position, _, _ in verification_prompts:
+        result = results_by_position[position]
+        if isinstance(result, Exception):
+            st.error(f"Error verifying medicine at position {position}: {result}")
+            verification_results.append((position, f"Error: {str(result)}"))
+            continue
+        st.write(f"Verified medicine at position {position}")
+        verification_results.append((position, result))
 
     verification_results.sort(key=lambda x: x[0])
     return verification_results
 
 
-# Function to process final results and format the output
-def format_final_results(verification_results):
-    final_prompt = """
+# Yield response text as Gemini streams it, driving the stream on the shared loop
+def stream_content_text(**kwargs):
+    stream = run_async(generate_content_stream_async(**kwargs))
+    while True:
+        try:
+            chunk = run_async(anext(stream))
+        except StopAsyncIteration:
+            return
+        if chunk.text:
+            yield chunk.text
+
+
+# Template for the final analysis prompt, parsed once at import
+FINAL_PROMPT = string.Template(
+    """
     You are a medical prescription expert specializing in Bangladeshi medicines. 
     I will provide you with verification results for medicines from a prescription.
     
@@ -221,28 +651,43 @@ def format_final_results(verification_results):
     
     Here are the verification results for each medicine position:
     
-    {VERIFICATION_RESULTS}
+    ${VERIFICATION_RESULTS}
     """
+)
 
-    formatted_results = ""
-    for i, (position, result) in enumerate(verification_results, 1):
-        formatted_results += f"\n--- Medicine Position {position} ---\n"
-        formatted_results += result + "\n"
-        formatted_results += "-" * 40 + "\n"
-
-    final_prompt = final_prompt.replace("{VERIFICATION_RESULTS}", formatted_results)
 
-    response = client.models.generate_content(
-        model=model_id,
-        contents=final_prompt,
-        config=GenerateContentConfig(
-            tools=[google_search_tool],
-            response_modalities=["TEXT"],
-            temperature=0.1,
-        ),
+# Function to process final results and render the output as it streams in.
+# The response is cached on disk rather than with st.cache_data so that a
+# fresh analysis can still be streamed to the page.
+def format_final_results(verification_results):
+    formatted_parts = []
+    for position, result in verification_results:
+        formatted_parts.append(
+            f"\n--- Medicine Position {position} ---\n{result}\n{'-' * 40}\n"
+        )
+    formatted_results = "".join(formatted_parts)
+
+    final_prompt = FINAL_PROMPT.substitute(VERIFICATION_RESULTS=formatted_results)
+
+    cache_key = make_cache_key("final", model_id, final_prompt)
+    final_text = gemini_cache.get(cache_key)
+    if final_text is not None:
+        st.markdown(final_text)
+        return final_text
+
+    final_text = st.write_stream(
+        stream_content_text(
+            model=model_id,
+            contents=final_prompt,
+            config=GenerateContentConfig(
+                tools=[get_search_tool()],
+                response_modalities=["TEXT"],
+                temperature=0.1,
+            ),
+        )
     )
-
-    return response.text
+    gemini_cache.set(cache_key, final_text, expire=CACHE_TTL)
+    return final_text
 
 
 # Main execution flow
@@ -251,8 +696,8 @@ def main():
         st.warning("Please upload an image to proceed.")
         return
 
-    # Convert uploaded file to Part for Gemini API
-    image = Part.from_bytes(data=uploaded_file.read(), mime_type="image/jpeg")
+    # Raw bytes hash natively, so cached stages skip work for an unchanged upload
+    image_bytes = prepare_image_bytes(uploaded_file.getvalue())
 
     # Process button
     if st.button("Process Prescription"):
@@ -261,7 +706,7 @@ def main():
 
             # Execute all interpretation passes
             st.write("Running multiple interpretation passes in parallel...")
-            all_interpretations = run_parallel_interpretations(image)
+            all_interpretations = run_parallel_interpretations(image_bytes)
 
             interpretation_time = time.time()
             st.write(
@@ -297,7 +742,9 @@ def main():
                 for position, group_text, _ in medicine_groups:
                     st.write(group_text)
 
-            # Verify medicine groups
+            # Verify medicine groups. The final analysis below is not started
+            # speculatively: its prompt embeds every verification result, and
+            # the verifications already share one batched call (or one gather).
             st.write(
                 "Verifying medicine groups with Google Search (this may take some time)..."
             )
@@ -308,9 +755,10 @@ def main():
                 f"Medicine verification completed in {verification_time - interpretation_time:.2f} seconds"
             )
 
-            # Format final results
+            # Format final results, streaming them to the page as they arrive
             st.write("Generating final analysis with verified medicine names...")
-            final_result = format_final_results(verification_results)
+            st.write("### Final Prescription Medicines")
+            format_final_results(verification_results)
 
             end_time = time.time()
             st.write(
@@ -318,10 +766,6 @@ def main():
             )
             st.write(f"Total processing time: {end_time - start_time:.2f} seconds")
 
-            # Display final results
-            st.write("### Final Prescription Medicines")
-            st.code(final_result)
-
 
 if __name__ == "__main__":
     main()
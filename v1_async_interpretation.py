@@ -1,13 +1,22 @@
 import asyncio
-import nest_asyncio
 import re
-from collections import defaultdict
+import time
 from google import genai
 from google.genai.types import Part, Tool, GenerateContentConfig, GoogleSearch
 from google.colab import files
 
-# Apply nest_asyncio for Google Colab
-nest_asyncio.apply()
+# Apply nest_asyncio only inside Colab/Jupyter, where the notebook already runs an event loop;
+# elsewhere use the faster uvloop event loop if it is installed
+try:
+    get_ipython  # noqa: F821
+    import nest_asyncio
+    nest_asyncio.apply()
+except NameError:
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
 # Initialize the client
 API_KEY = ""
@@ -88,14 +97,17 @@ async def run_parallel_interpretations(num_passes=5):
 
 # Generate final consolidated output
 async def generate_final_output(all_interpretations):
-    consolidation_prompt = """
+    # Format all interpretations into a single string
+    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
+    
+    consolidation_prompt = f"""
     I have multiple interpretations of a handwritten prescription. Each interpretation attempts to extract 
     medicine names, dosages, and instructions. Please consolidate these interpretations into a single, 
     accurate list of medicines with their dosages and instructions.
     
     Here are the multiple interpretations:
     
-    {INTERPRETATIONS}
+    {all_interpretations_text}
     
     Based on these interpretations, please provide a final consolidated output in this exact format:
     
@@ -118,12 +130,6 @@ async def generate_final_output(all_interpretations):
     - Don't include any explanations or notes - just the structured output
     """
     
-    # Format all interpretations into a single string
-    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
-    
-    # Replace placeholder with actual interpretations
-    consolidation_prompt = consolidation_prompt.replace("{INTERPRETATIONS}", all_interpretations_text)
-    
     response = await client.aio.models.generate_content(
         model=model_id,
         contents=consolidation_prompt,
@@ -137,9 +143,10 @@ async def generate_final_output(all_interpretations):
 # Async main
 async def main():
     print("Running multiple interpretation passes in parallel...")
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
 
     all_interpretations = await run_parallel_interpretations()
+    t_interp = time.perf_counter() - start_time
     
     print("\nAll interpretation passes completed.\n")
     for idx, interpretation in enumerate(all_interpretations, 1):
@@ -148,8 +155,10 @@ async def main():
     print("\nGenerating consolidated final output...")
     final_result = await generate_final_output(all_interpretations)
 
-    end_time = asyncio.get_event_loop().time()
-    print(f"\nTotal processing time: {end_time - start_time:.2f} seconds")
+    end_time = time.perf_counter()
+    print(f"\nInterpretation time: {t_interp:.2f} seconds")
+    print(f"Final output time: {end_time - start_time - t_interp:.2f} seconds")
+    print(f"Total processing time: {end_time - start_time:.2f} seconds")
 
     print("\n=== FINAL CONSOLIDATED PRESCRIPTION MEDICINES ===")
     print(final_result)
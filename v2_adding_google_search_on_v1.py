@@ -1,13 +1,22 @@
 import asyncio
-import nest_asyncio
 import re
-from collections import defaultdict
+import time
 from google import genai
 from google.genai.types import Part, Tool, GenerateContentConfig, GoogleSearch
 from google.colab import files
 
-# Apply nest_asyncio for Google Colab
-nest_asyncio.apply()
+# Apply nest_asyncio only inside Colab/Jupyter, where the notebook already runs an event loop;
+# elsewhere use the faster uvloop event loop if it is installed
+try:
+    get_ipython  # noqa: F821
+    import nest_asyncio
+    nest_asyncio.apply()
+except NameError:
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
 # Initialize the client
 API_KEY = ""
@@ -87,14 +96,17 @@ async def run_parallel_interpretations(num_passes=5):
 # Generate final consolidated output
 async def generate_consolidated_medicines(all_interpretations):
     """First consolidate all interpretations into a single list of medicines"""
-    consolidation_prompt = """
+    # Format all interpretations into a single string
+    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
+    
+    consolidation_prompt = f"""
     I have multiple interpretations of a handwritten prescription. Each interpretation attempts to extract 
     medicine names, dosages, and instructions. Please consolidate these interpretations into a single, 
     accurate list of medicines with their dosages and instructions.
     
     Here are the multiple interpretations:
     
-    {INTERPRETATIONS}
+    {all_interpretations_text}
     
     Based on these interpretations, please provide a final consolidated output in this exact format:
     
@@ -117,12 +129,6 @@ async def generate_consolidated_medicines(all_interpretations):
     - Don't include any explanations or notes - just the structured output
     """
     
-    # Format all interpretations into a single string
-    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
-    
-    # Replace placeholder with actual interpretations
-    consolidation_prompt = consolidation_prompt.replace("{INTERPRETATIONS}", all_interpretations_text)
-    
     response = await client.aio.models.generate_content(
         model=model_id,
         contents=consolidation_prompt,
@@ -172,19 +178,35 @@ async def extract_medicines_from_consolidated(consolidated_text):
 async def generate_final_output(all_interpretations):
     """Generate final output with verified medicine names"""
     # First consolidate all interpretations
+    stage_start = time.perf_counter()
     consolidated_text = await generate_consolidated_medicines(all_interpretations)
+    t_consolidate = time.perf_counter() - stage_start
     
     # Extract medicine names from consolidated text
     medicine_names = await extract_medicines_from_consolidated(consolidated_text)
     
     print(f"\nFound {len(medicine_names)} medicines to verify...")
+    print("Starting parallel verification of all medicines...")
+    
+    # Verify all medicine names in parallel, at most 8 at a time to stay within the Gemini quota
+    semaphore = asyncio.Semaphore(8)
+    
+    async def verify_with_limit(name):
+        async with semaphore:
+            return await verify_medicine_name(name)
+    
+    stage_start = time.perf_counter()
+    verification_results_list = await asyncio.gather(*(verify_with_limit(name) for name in medicine_names))
+    t_verify = time.perf_counter() - stage_start
     
-    # Verify each medicine name
-    verification_results = {}
-    for name in medicine_names:
-        print(f"Verifying medicine: {name}")
-        verification_result = await verify_medicine_name(name)
-        verification_results[name] = verification_result
+    # Create a dictionary mapping medicine names to their verification results
+    verification_results = dict(zip(medicine_names, verification_results_list))
+    
+    for name in verification_results:
+        print(f"Verified medicine: {name}")
+    
+    # Give the model readable Markdown rather than the dict's repr with escaped newlines and quotes
+    verification_block = "\n".join(f"### {name}\n{result}\n" for name, result in verification_results.items())
     
     # Create final output with verification results
     final_prompt = f"""
@@ -194,7 +216,7 @@ async def generate_final_output(all_interpretations):
     
     For each medicine, I have verification results from searching Bangladeshi pharmacy websites:
     
-    {verification_results}
+    {verification_block}
     
     Please create a final formatted output that includes:
     1. The original medicine name from the prescription
@@ -219,6 +241,7 @@ async def generate_final_output(all_interpretations):
     - Keep the same order of medicines as in the consolidated list
     """
     
+    stage_start = time.perf_counter()
     response = await client.aio.models.generate_content(
         model=model_id,
         contents=final_prompt,
@@ -226,15 +249,19 @@ async def generate_final_output(all_interpretations):
             temperature=0.1,
         ),
     )
+    t_final = time.perf_counter() - stage_start
+    
+    print(f"\nConsolidation: {t_consolidate:.2f}s, verification: {t_verify:.2f}s, final formatting: {t_final:.2f}s")
     
     return response.text
 
 # Async main
 async def main():
     print("Running multiple interpretation passes in parallel...")
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
 
     all_interpretations = await run_parallel_interpretations()
+    t_interp = time.perf_counter() - start_time
     
     print("\nAll interpretation passes completed.\n")
     for idx, interpretation in enumerate(all_interpretations, 1):
@@ -243,8 +270,10 @@ async def main():
     print("\nConsolidating interpretations and verifying medicine names...")
     final_result = await generate_final_output(all_interpretations)
 
-    end_time = asyncio.get_event_loop().time()
-    print(f"\nTotal processing time: {end_time - start_time:.2f} seconds")
+    end_time = time.perf_counter()
+    print(f"\nInterpretation time: {t_interp:.2f} seconds")
+    print(f"Final output time: {end_time - start_time - t_interp:.2f} seconds")
+    print(f"Total processing time: {end_time - start_time:.2f} seconds")
 
     print("\n=== FINAL PRESCRIPTION MEDICINES WITH VERIFICATION ===")
     print(final_result)
@@ -1,17 +1,51 @@
 import asyncio
-import nest_asyncio
+import hashlib
+import hmac
+import io
+import json
+import os
 import re
-from collections import defaultdict
+import time
+import diskcache
+import httpx
+from async_lru import alru_cache
+from cryptography.fernet import Fernet, InvalidToken
+from collections import Counter
+from PIL import Image, ImageOps
 from google import genai
-from google.genai.types import Part, Tool, GenerateContentConfig, GoogleSearch
+from google.genai import errors
+from google.genai.types import Part, Tool, GenerateContentConfig, GoogleSearch, HttpOptions
 from google.colab import files
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
-# Apply nest_asyncio for Google Colab
-nest_asyncio.apply()
+# Apply nest_asyncio only inside Colab/Jupyter, where the notebook already runs an event loop;
+# elsewhere use the faster uvloop event loop if it is installed
+try:
+    get_ipython  # noqa: F821
+    import nest_asyncio
+    nest_asyncio.apply()
+except NameError:
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
 # Initialize the client
 API_KEY = ""
-client = genai.Client(api_key=API_KEY)
+# Share one connection pool across all async calls so the parallel fan-outs reuse
+# TLS sessions instead of connecting per request
+connection_limits = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+try:
+    async_http_client = httpx.AsyncClient(http2=True, limits=connection_limits)
+except ImportError:
+    # HTTP/2 needs `pip install "httpx[http2]"`; keep the shared pool over HTTP/1.1 without it
+    async_http_client = httpx.AsyncClient(limits=connection_limits)
+
+client = genai.Client(
+    api_key=API_KEY,
+    http_options=HttpOptions(httpx_async_client=async_http_client),
+)
 model_id = "gemini-2.0-flash"
 
 # Configure Google Search Tool
@@ -19,12 +53,69 @@ google_search_tool = Tool(
     google_search=GoogleSearch()
 )
 
+# Cap concurrent Gemini calls so a long prescription doesn't trip the rate limit
+GEMINI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_CONCURRENCY", "6")))
+
+def is_retryable_error(exception):
+    """Rate limiting (429) and server-side errors are worth retrying"""
+    if isinstance(exception, errors.ServerError):
+        return True
+    return isinstance(exception, errors.ClientError) and exception.code == 429
+
+gemini_retry = retry(
+    stop=stop_after_attempt(5),
+    wait=wait_random_exponential(multiplier=1, max=30),
+    retry=retry_if_exception(is_retryable_error),
+    reraise=True,
+)
+
+@gemini_retry
+async def call_gemini(**kwargs):
+    """Single entry point for Gemini calls, with bounded concurrency and jittered backoff"""
+    async with GEMINI_SEMAPHORE:
+        return await client.aio.models.generate_content(**kwargs)
+
+@gemini_retry
+async def call_gemini_stream(**kwargs):
+    """Streaming variant of call_gemini; the limit and retries apply to opening the stream"""
+    async with GEMINI_SEMAPHORE:
+        return await client.aio.models.generate_content_stream(**kwargs)
+
+# Ask for all interpretation passes in one request (one image prefill, one round-trip).
+# Set to False to sample each pass with its own independent request instead.
+BATCH_INTERPRETATIONS = True
+
+# Persistent cache of verification results; the pharmacy catalog changes slowly.
+# Medicine names are patient data, so entries are keyed by an HMAC of the name and
+# stored encrypted. The key (from Fernet.generate_key()) is kept out of the cache
+# in MED_CACHE_KEY; without it, verifications are only cached in memory.
+MED_CACHE_KEY = os.getenv("MED_CACHE_KEY")
+VERIFICATION_CACHE_TTL = 30 * 24 * 3600
+if MED_CACHE_KEY:
+    verification_cipher = Fernet(MED_CACHE_KEY)
+    verification_cache = diskcache.Cache("./med_verify_cache")
+else:
+    verification_cipher = verification_cache = None
+    print("MED_CACHE_KEY is not set, so verification results are not cached across runs")
+
+# Matches "Medicine X:" followed by a "- Name:" line, also when Gemini bolds them
+# as "**Medicine X:**" / "- **Name:**"
+_MED_NAME_RE = re.compile(r"Medicine\s+\d+:\**\s*\n\s*-\s*\**Name:\**\s*([^\n(]+)", re.IGNORECASE)
+
 # Upload the image
 print("Please upload the prescription image:")
 uploaded = files.upload()
 file_name = list(uploaded.keys())[0]
 file_content = uploaded[file_name]
 
+# Downscale and recompress once before upload; phone photos shrink ~10x and
+# every interpretation pass reuses the smaller image
+prescription_image = ImageOps.exif_transpose(Image.open(io.BytesIO(file_content)))
+prescription_image.thumbnail((1568, 1568), Image.LANCZOS)
+buffer = io.BytesIO()
+prescription_image.convert("RGB").save(buffer, "JPEG", quality=85, optimize=True)
+file_content = buffer.getvalue()
+
 image = Part.from_bytes(
     data=file_content,
     mime_type="image/jpeg"
@@ -68,184 +159,361 @@ TASK:
 
 # Async Function to generate interpretation
 async def generate_interpretation(temperature):
-    response = await client.aio.models.generate_content(
+    stream = await call_gemini_stream(
         model=model_id,
         contents=[initial_prompt, image],
         config=GenerateContentConfig(
             temperature=temperature,
         ),
     )
-    return response.text
+    chunks = []
+    async for chunk in stream:
+        if chunk.text:
+            chunks.append(chunk.text)
+    return "".join(chunks)
+
+# Async Function to generate all interpretations with a single batched request
+async def generate_batched_interpretations(num_passes):
+    batched_prompt = f"""{initial_prompt}
+    Produce exactly {num_passes} independent interpretations of this prescription.
+    Return them as a JSON array of {num_passes} strings, each string being one complete
+    interpretation in the OUTPUT FORMAT above.
+    """
+    response = await call_gemini(
+        model=model_id,
+        contents=[batched_prompt, image],
+        config=GenerateContentConfig(
+            temperature=0.2,
+            response_mime_type="application/json",
+            response_schema=list[str],
+        ),
+    )
+    return response.parsed or []
 
 # Run multiple interpretations concurrently
 async def run_parallel_interpretations(num_passes=3):
+    if BATCH_INTERPRETATIONS:
+        try:
+            results = await generate_batched_interpretations(num_passes)
+        except errors.APIError as e:
+            print(f"Batched interpretation failed: {e}")
+            results = []
+        if results:
+            return results
+        print("Batched interpretation returned nothing, falling back to separate passes...")
+
     # Using fixed temperature of 0.2 as in your updated paste
     # But running multiple passes for different interpretations
-    tasks = [generate_interpretation(0.2) for _ in range(num_passes)]
-    results = await asyncio.gather(*tasks)
+    async def run_pass():
+        # Return the error instead of raising so one failed pass doesn't cancel its siblings
+        try:
+            return await generate_interpretation(0.2)
+        except Exception as e:
+            return e
+    
+    # Passes agree once a majority read the same medicine names; the rest are then cancelled
+    quorum = num_passes // 2 + 1
+    fingerprints = Counter()
+    results = []
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(run_pass()) for _ in range(num_passes)]
+        
+        # Report each pass as soon as it finishes
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            if isinstance(result, Exception):
+                print(f"Interpretation pass failed: {result}")
+                continue
+            results.append(result)
+            print(f"Interpretation pass {len(results)}/{num_passes} completed")
+            
+            fingerprint = tuple(sorted(name.lower() for name in extract_medicines_from_consolidated(result)))
+            if not fingerprint:
+                continue
+            fingerprints[fingerprint] += 1
+            if fingerprints[fingerprint] >= quorum and len(results) < num_passes:
+                print(f"{quorum} passes agree, cancelling the remaining passes")
+                for task in tasks:
+                    task.cancel()
+                break
     return results
 
-# Generate final consolidated output
-async def generate_consolidated_medicines(all_interpretations):
-    """First consolidate all interpretations into a single list of medicines"""
-    consolidation_prompt = """
-    I have multiple interpretations of a handwritten prescription. Each interpretation attempts to extract 
-    medicine names, dosages, and instructions. Please consolidate these interpretations into a single, 
-    accurate list of medicines with their dosages and instructions.
-    
-    Here are the multiple interpretations:
+def verification_cache_key(medicine_name):
+    """Keyed hash of the normalized medicine name"""
+    normalized_name = re.sub(r"\s+", " ", medicine_name.strip().lower())
+    return hmac.new(MED_CACHE_KEY.encode(), normalized_name.encode(), hashlib.sha256).hexdigest()
+
+def load_cached_verification(medicine_name):
+    """Decrypt a cached verification, or return None if there is none"""
+    if verification_cache is None:
+        return None
+    token = verification_cache.get(verification_cache_key(medicine_name))
+    if token is None:
+        return None
+    try:
+        return verification_cipher.decrypt(token).decode()
+    except InvalidToken:
+        return None
+
+def store_cached_verification(medicine_name, result):
+    """Encrypt and cache a successful verification"""
+    if verification_cache is None:
+        return
+    token = verification_cipher.encrypt(result.encode())
+    verification_cache.set(verification_cache_key(medicine_name), token, expire=VERIFICATION_CACHE_TTL)
+
+# Failures raise instead of returning an error string, so alru_cache doesn't keep them
+@alru_cache(maxsize=256)
+async def verify_medicine_name(medicine_name):
+    """Verify a medicine name using Google Search, focusing on Bangladesh pharmacy websites"""
+    cached_result = load_cached_verification(medicine_name)
+    if cached_result is not None:
+        return cached_result
     
-    {INTERPRETATIONS}
+    verification_prompt = f"""
+    I need to verify a medicine name '{medicine_name}' that was extracted from a handwritten prescription.
     
-    Based on these interpretations, please provide a final consolidated output in this exact format:
+    Please search for this medicine name on Bangladeshi pharmacy websites like MedEx, Arogga, or Lazzypharm.
     
-    Medicine 1:
-    - Name: [exactly as written (don't include the power just medicine name only)]
-    - Dosage: [frequency pattern]
-    - Instructions: [any special directions]
+    If you find a close match (e.g., "Amlovand" is actually "Amlocard"), return a JSON object:
     
-    Medicine 2:
-    - Name: [exactly as written]
-    - Dosage: [frequency pattern]
-    - Instructions: [any special directions]
+    {{
+      "verified_name": "the correct medicine name as found on these websites",
+      "description": "brief description of what this medicine is used for",
+      "company": "the pharmaceutical company that makes it (if available)",
+      "url": "URL of the medicine page (if available)"
+    }}
     
-    [continue for all medicines]
+    If you can't find a close match, return the same object with an empty "verified_name".
     
-    IMPORTANT:
-    - If there are conflicting interpretations, choose the most likely one based on frequency and confidence
-    - If dosage or instructions are missing in some interpretations but present in others, include them
-    - Maintain the exact format specified above
-    - Don't include any explanations or notes - just the structured output
+    IMPORTANT: 
+    1. Focus your search specifically on Bangladeshi pharmaceutical websites and databases
+    2. Use search terms like "[medicine name] bangladesh pharmacy" or "[medicine name] medex arogga"
+    3. Make sure to check for spelling variations and similar-sounding medicine names
+    4. Return only the JSON object - no explanations or Markdown
     """
     
-    # Format all interpretations into a single string
-    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
-    
-    # Replace placeholder with actual interpretations
-    consolidation_prompt = consolidation_prompt.replace("{INTERPRETATIONS}", all_interpretations_text)
-    
-    response = await client.aio.models.generate_content(
+    response = await call_gemini(
         model=model_id,
-        contents=consolidation_prompt,
+        contents=verification_prompt,
         config=GenerateContentConfig(
+            tools=[google_search_tool],
             temperature=0.1,
         ),
     )
     
+    store_cached_verification(medicine_name, response.text)
     return response.text
 
-async def verify_medicine_name(medicine_name):
-    """Verify a medicine name using Google Search, focusing on Bangladesh pharmacy websites"""
-    verification_prompt = f"""
-    I need to verify a medicine name '{medicine_name}' that was extracted from a handwritten prescription.
-    
-    Please search for this medicine name on Bangladeshi pharmacy websites like MedEx, Arogga, or Lazzypharm.
-    
-    If you find a close match (e.g., "Amlovand" is actually "Amlocard"), provide:
-    1. The correct medicine name as found on these websites (format: OriginalName → VerifiedName)
-    2. A brief description of what this medicine is used for
-    3. The pharmaceutical company that makes it (if available)
-    4. URL of the medicine page (if available)
-    
-    If you can't find a close match, just indicate that you couldn't verify it.
-    
-    IMPORTANT: 
-    1. Focus your search specifically on Bangladeshi pharmaceutical websites and databases
-    2. Use search terms like "[medicine name] bangladesh pharmacy" or "[medicine name] medex arogga"
-    3. Make sure to check for spelling variations and similar-sounding medicine names
-    4. Be concise in your response
+async def verify_medicine_names_batched(medicine_names):
+    """Verify several medicine names with one search-grounded call.
+    Returns results by name; names the reply didn't answer usably map to None."""
+    results = {name: load_cached_verification(name) for name in medicine_names}
+    pending_names = [name for name, result in results.items() if result is None]
+    
+    if pending_names:
+        numbered_names = "\n    ".join(f"{idx}. {name}" for idx, name in enumerate(pending_names, 1))
+        verification_prompt = f"""
+    I need to verify these medicine names that were extracted from a handwritten prescription:
+    
+    {numbered_names}
+    
+    For each medicine, search Bangladeshi pharmacy websites like MedEx, Arogga, or Lazzypharm
+    (medex.com.bd, arogga.com, lazzypharm.com) and check for spelling variations and similar-sounding
+    names (e.g., "Amlovand" is actually "Amlocard").
+    
+    Return a JSON object keyed by the medicine's number:
+    
+    {{
+      "1": {{
+        "verified_name": "the correct medicine name as found on these websites, or empty string if not found",
+        "description": "brief description of what this medicine is used for",
+        "company": "the pharmaceutical company that makes it (if available)",
+        "url": "URL of the medicine page (if available)"
+      }}
+    }}
+    
+    Return only the JSON object - no explanations or Markdown
     """
+        
+        try:
+            response = await call_gemini(
+                model=model_id,
+                contents=verification_prompt,
+                config=GenerateContentConfig(
+                    tools=[google_search_tool],
+                    temperature=0.1,
+                ),
+            )
+        except Exception as e:
+            print(f"Batched verification failed: {e}")
+            return results
+        
+        verifications = parse_json_response(response.text)
+        if not isinstance(verifications, dict):
+            return results
+        
+        for idx, name in enumerate(pending_names, 1):
+            verification = verifications.get(str(idx))
+            if isinstance(verification, dict):
+                results[name] = json.dumps(verification, ensure_ascii=False)
+                store_cached_verification(name, results[name])
     
+    return results
+
+def extract_medicines_from_consolidated(consolidated_text):
+    """Extract medicine names from the consolidated text for verification"""
+    # Keep only the handwritten name when the line already shows "Original → Verified"
+    return [name.split("→")[0].strip(" *") for name in _MED_NAME_RE.findall(consolidated_text)]
+
+def parse_json_response(text):
+    """Parse a JSON response, returning None if it isn't valid JSON"""
+    # Search-grounded calls can't enforce a response schema, so Gemini may still wrap the JSON in a code fence
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
     try:
-        response = await client.aio.models.generate_content(
-            model=model_id,
-            contents=verification_prompt,
-            config=GenerateContentConfig(
-                tools=[google_search_tool],
-                temperature=0.1,
-            ),
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+def parse_medicines_json(text):
+    """Parse the JSON medicine list, returning None unless the response is a JSON array of named objects"""
+    medicines = parse_json_response(text)
+    if not isinstance(medicines, list):
+        return None
+    if not all(isinstance(medicine, dict) and isinstance(medicine.get("name"), str) for medicine in medicines):
+        return None
+    return medicines
+
+def parse_verification(text):
+    """Parse one verification result, keeping free text (e.g. an error) as its description"""
+    verification = parse_json_response(text)
+    return verification if isinstance(verification, dict) else {"description": text}
+
+def render_medicines(medicines, verification_results=None):
+    """Render the medicine list in the usual Markdown layout, preferring individual verification results"""
+    verification_results = verification_results or {}
+    blocks = []
+    for idx, medicine in enumerate(medicines, 1):
+        # Gemini sometimes sends null for fields it couldn't read
+        name = medicine.get("name") or ""
+        verification = verification_results.get(name, {})
+        verified_name = verification.get("verified_name") or medicine.get("verified_name")
+        description = verification.get("description") or medicine.get("description") or ""
+        if verified_name and verified_name != name:
+            name = f"{name} → {verified_name}"
+        blocks.append(
+            f"Medicine {idx}:\n"
+            f"- Name: {name}\n"
+            f"- Dosage: {medicine.get('dosage') or ''}\n"
+            f"- Instructions: {medicine.get('instructions') or ''}\n"
+            f"- Description: {description}"
         )
-        return response.text
-    except Exception as e:
-        return f"Error verifying medicine: {str(e)}"
+    return "\n\n".join(blocks)
 
-async def extract_medicines_from_consolidated(consolidated_text):
-    """Extract medicine names from the consolidated text for verification"""
-    # This regex looks for "Medicine X:" followed by a "- Name:" line
-    pattern = r"Medicine \d+:\s*\n\s*- Name: ([^\n\(]+)"
-    medicine_names = re.findall(pattern, consolidated_text)
-    return [name.strip() for name in medicine_names]
+def is_search_grounded(response):
+    """Check whether Gemini actually ran Google Search while answering"""
+    if not response.candidates:
+        return False
+    grounding_metadata = response.candidates[0].grounding_metadata
+    return bool(grounding_metadata and grounding_metadata.grounding_chunks)
 
 async def generate_final_output(all_interpretations):
-    """Generate final output with verified medicine names"""
-    # First consolidate all interpretations
-    consolidated_text = await generate_consolidated_medicines(all_interpretations)
-    
-    # Extract medicine names from consolidated text
-    medicine_names = await extract_medicines_from_consolidated(consolidated_text)
-    
-    print(f"\nFound {len(medicine_names)} medicines to verify...")
-    print(f"Starting parallel verification of all medicines...")
-    
-    # Verify all medicine names in parallel
-    verification_tasks = [verify_medicine_name(name) for name in medicine_names]
-    verification_results_list = await asyncio.gather(*verification_tasks)
-    
-    # Create a dictionary mapping medicine names to their verification results
-    verification_results = {name: result for name, result in zip(medicine_names, verification_results_list)}
-    
-    for name, result in verification_results.items():
-        print(f"Verified medicine: {name}")
+    """Consolidate, verify and format all medicines in a single search-grounded call"""
+    # Format all interpretations into a single string
+    all_interpretations_text = "\n\n--- INTERPRETATION ---\n".join(all_interpretations)
     
-    # Create final output with verification results
     final_prompt = f"""
-    Here is a consolidated list of medicines from a prescription:
-    
-    {consolidated_text}
-    
-    For each medicine, I have verification results from searching Bangladeshi pharmacy websites:
+    I have multiple interpretations of a handwritten prescription. Each interpretation attempts to extract 
+    medicine names, dosages, and instructions.
     
-    {verification_results}
+    Here are the multiple interpretations:
     
-    Please create a final formatted output that includes:
-    1. The original medicine name from the prescription
-    2. The verified correct medicine name from pharmacy websites (if found)
-    3. Dosage and instructions from the original consolidated list
-    4. A brief description of what the medicine is used for (if available)
+    {all_interpretations_text}
     
-    Use this exact format:
+    Consolidate these interpretations into a single, accurate list of medicines. For each medicine,
+    call google_search to verify the name against Bangladeshi pharmacy websites (medex.com.bd,
+    arogga.com, lazzypharm.com) before writing its description.
     
-    Medicine 1:
-    - Name: [original handwritten name] → [verified name from pharmacy websites, if different]
-    - Dosage: [frequency pattern]
-    - Instructions: [any special directions]
-    - Description: [brief description of what the medicine is used for]
+    Return a JSON array with one object per medicine, using exactly these keys:
     
-    Medicine 2:
-    ...
+    [
+      {{
+        "name": "original handwritten name (don't include the power just medicine name only)",
+        "verified_name": "verified name from pharmacy websites, or empty string if none was found",
+        "dosage": "frequency pattern",
+        "instructions": "any special directions",
+        "description": "brief description of what the medicine is used for"
+      }}
+    ]
     
     IMPORTANT: 
-    - If the verified name is the same as the original, just show the name once
-    - If no verified name was found, only show the original name
-    - Keep the same order of medicines as in the consolidated list
+    - If there are conflicting interpretations, choose the most likely one based on frequency and confidence
+    - If dosage or instructions are missing in some interpretations but present in others, include them
+    - Check for spelling variations and similar-sounding medicine names (e.g., "Amlovand" is actually "Amlocard")
+    - Return only the JSON array - no explanations, notes or Markdown
     """
     
-    response = await client.aio.models.generate_content(
+    response = await call_gemini(
         model=model_id,
         contents=final_prompt,
         config=GenerateContentConfig(
+            tools=[google_search_tool],
             temperature=0.1,
         ),
     )
+    final_text = response.text
+    
+    medicines = parse_medicines_json(final_text)
+    if medicines is None:
+        # Gemini ignored the JSON instruction: keep its text and recover the names with the regex
+        medicine_names = extract_medicines_from_consolidated(final_text)
+    else:
+        medicine_names = [medicine["name"] for medicine in medicines]
+    
+    if is_search_grounded(response):
+        return final_text if medicines is None else render_medicines(medicines)
+    
+    # Search grounding returned nothing: fall back to verifying each medicine on its own.
+    # The same drug is often prescribed twice (e.g. morning and night strengths), so
+    # each distinct name is verified only once
+    unique_names = {}
+    for name in medicine_names:
+        unique_names.setdefault(name.strip().lower(), name.strip())
+    
+    print(f"\nSearch grounding returned no results, verifying {len(unique_names)} medicines individually...")
+    
+    # Verify all distinct names in one call, then in parallel one by one for any it didn't answer
+    batched_results = await verify_medicine_names_batched(list(unique_names.values()))
+    missing_names = [name for name, result in batched_results.items() if result is None]
+    verification_tasks = [verify_medicine_name(name) for name in missing_names]
+    batched_results.update(zip(missing_names, await asyncio.gather(*verification_tasks, return_exceptions=True)))
+    lookup = {key: batched_results[name] for key, name in unique_names.items()}
+    verification_results = {}
+    for name in medicine_names:
+        result = lookup[name.strip().lower()]
+        if isinstance(result, Exception):
+            result = f"Error verifying medicine: {result}"
+        verification_results[name] = result
+    
+    if medicines is not None:
+        # Fold the verified names and descriptions straight into the rendered list
+        return render_medicines(
+            medicines, {name: parse_verification(result) for name, result in verification_results.items()}
+        )
     
-    return response.text
+    verification_notes = "\n\n".join(
+        f"{name}:\n{result}" for name, result in verification_results.items()
+    )
+    return f"{final_text}\n\n=== INDIVIDUAL VERIFICATION RESULTS ===\n{verification_notes}"
 
 # Async main
 async def main():
     print("Running multiple interpretation passes in parallel...")
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
 
     all_interpretations = await run_parallel_interpretations()
+    t_interp = time.perf_counter() - start_time
     
     print("\nAll interpretation passes completed.\n")
     for idx, interpretation in enumerate(all_interpretations, 1):
@@ -254,8 +522,10 @@ async def main():
     print("\nConsolidating interpretations and verifying medicine names...")
     final_result = await generate_final_output(all_interpretations)
 
-    end_time = asyncio.get_event_loop().time()
-    print(f"\nTotal processing time: {end_time - start_time:.2f} seconds")
+    end_time = time.perf_counter()
+    print(f"\nInterpretation time: {t_interp:.2f} seconds")
+    print(f"Final output time: {end_time - start_time - t_interp:.2f} seconds")
+    print(f"Total processing time: {end_time - start_time:.2f} seconds")
 
     print("\n=== FINAL PRESCRIPTION MEDICINES WITH VERIFICATION ===")
     print(final_result)